@@ -1,11 +1,19 @@
+import numpy as np
 import pandas as pd
 import re
+import itertools
+from collections.abc import Iterable, Iterator
 import nltk
-from nltk import pos_tag
 from nltk.corpus import gutenberg
 from nltk.tokenize import sent_tokenize, RegexpTokenizer
+from nltk.tag.perceptron import PerceptronTagger
 from IPython.display import display
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 nltk.download('gutenberg')
 tokenizer = RegexpTokenizer(r'\w+')
 
@@ -15,7 +23,24 @@ nltk.download('wordnet')
 nltk.download('omw-1.4')
 nltk.download('averaged_perceptron_tagger_eng')
 
+# Load the tagger model once per process and tag with it directly
+_TAGGER = PerceptronTagger()
+
 PUNCT = set("\'`!@#$%^&*()_-+=[]|;:<>,.?/{\\}")
+_STRIP_CHARS = "_" + "".join(PUNCT)
+_ALNUM_RE = re.compile(r"[A-Za-z0-9]")
+
+# Every string matched by the roman numeral grammar
+# ^M{0,3}(CM|CD|D?C{0,3})?(XC|XL|L?X{0,3})?(IX|IV|V?I{0,3})?$, enumerated
+# once so is_roman is a set lookup instead of a regex match.
+_ROMAN_SET = frozenset(
+    "".join(parts) for parts in itertools.product(
+        ["", "M", "MM", "MMM"],
+        ["", "CM", "CD", "C", "CC", "CCC", "D", "DC", "DCC", "DCCC"],
+        ["", "XC", "XL", "X", "XX", "XXX", "L", "LX", "LXX", "LXXX"],
+        ["", "IX", "IV", "I", "II", "III", "V", "VI", "VII", "VIII"],
+    )
+)
 
 def list_available_books() -> dict[str, str]:
     """
@@ -66,14 +91,7 @@ def is_roman(word):
     """
     Checks if the given word is a roman numeral.
     """
-    pattern = re.compile(r"""
-    ^M{0,3}
-    (CM|CD|D?C{0,3})?
-    (XC|XL|L?X{0,3})?
-    (IX|IV|V?I{0,3})?
-    $
-    """, re.VERBOSE | re.IGNORECASE)
-    return bool(re.match(pattern, word))
+    return word.upper() in _ROMAN_SET
 
 def get_sents(filename: str, is_gutenberg: bool = True) -> list[list[str]]:
     """
@@ -90,73 +108,140 @@ def get_sents(filename: str, is_gutenberg: bool = True) -> list[list[str]]:
         sentences = sent_tokenize(text)
         return [tokenizer.tokenize(sent) for sent in sentences]
     
-def merged_books_sents(filenames: list[tuple[str, bool]]) -> list[list[str]]:
+def merged_books_sents(filenames: list[tuple[str, bool]]) -> Iterator[list[str]]:
     """
     Given a list of filenames and boolean indicators for whether they are 
-    available in the nltk.gutenberg corpus, return a merged list of sentences
-    for all sentences across all passed books.
+    available in the nltk.gutenberg corpus, return an iterator over the 
+    sentences of all passed books, in order. Nothing is read until the 
+    iterator is consumed (e.g. by clean_sents).
     """
-    all = []
-    for b in filenames:
-        all.extend(get_sents(b[0], b[1]))
-    return all
+    return itertools.chain.from_iterable(get_sents(b[0], b[1]) for b in filenames)
 
-def clean_sents(sentences: str, min_sent_len: int, 
+def count_sents(filenames: list[tuple[str, bool]]) -> int:
+    """
+    Return the total number of sentences across all passed books, as they
+    would be yielded by merged_books_sents.
+    """
+    return sum(len(get_sents(b[0], b[1])) for b in filenames)
+
+def _is_chapter_heading(sent: list[str]) -> bool:
+    """
+    Checks if the given sentence is a chapter heading, i.e. it contains 
+    "CHAPTER", or "chapter" (any case) followed by an arabic or roman numeral.
+    """
+    if "CHAPTER" in sent:
+        return True
+    lowered = [tok.lower() for tok in sent]
+    if "chapter" in lowered:
+        i = lowered.index("chapter")
+        if i + 1 < len(sent):
+            nxt = sent[i + 1]
+            return nxt.isdigit() or is_roman(nxt)
+    return False
+
+def _clean_token(word: str, PoS: str) -> str | None:
+    """
+    Return the cleaned (stripped, lowercased) form of a POS-tagged token, or
+    None if the token should be dropped from its sentence.
+    """
+    if not _ALNUM_RE.search(word):
+        return None
+    if word.isdigit():
+        return None
+    if len(word) > 1 and is_roman(word):
+        return None
+    if word in PUNCT:
+        return None
+    # if PoS == 'NNP':
+    #     return word
+    w = word.strip(_STRIP_CHARS).lower()
+    if not w:
+        return None
+    if len(w) == 1 and w not in ('a', 'i'):
+        return None
+    return w
+
+def _filter_token_ids(tok_ids, offsets, clean_ids, min_sent_len, max_sent_len):
+    """
+    Map the flattened token ids of each sentence to cleaned word ids, drop
+    the tokens without one (-1) and keep the sentences whose cleaned length
+    is in range. Returns the flattened cleaned ids and their sentence offsets.
+    """
+    out = np.empty(len(tok_ids), dtype=np.int32)
+    out_offsets = np.zeros(len(offsets), dtype=np.int64)
+    n_out = 0
+    pos = 0
+    for s in range(len(offsets) - 1):
+        start = pos
+        for t in range(offsets[s], offsets[s + 1]):
+            c = clean_ids[tok_ids[t]]
+            if c >= 0:
+                out[pos] = c
+                pos += 1
+        if min_sent_len <= pos - start <= max_sent_len:
+            n_out += 1
+            out_offsets[n_out] = pos
+        else:
+            pos = start
+    return out[:pos], out_offsets[:n_out + 1]
+
+if njit is not None:
+    _filter_token_ids = njit(cache=True)(_filter_token_ids)
+
+def _clean_tagged_sents(tagged: list[list[tuple[str, str]]], min_sent_len: int,
+                        max_sent_len: int) -> list[list[str]]:
+    """
+    Clean POS-tagged sentences. Each unique (word, PoS) token is cleaned
+    once and given an id, so the per-token pass over the corpus only has to
+    filter ids (JIT-compiled when numba is available).
+    """
+    token_ids = {}
+    clean_ids = []
+    clean_words = {}
+    flat = []
+    offsets = [0]
+    for sent in tagged:
+        for tok in sent:
+            t = token_ids.get(tok)
+            if t is None:
+                t = token_ids[tok] = len(clean_ids)
+                w = _clean_token(*tok)
+                clean_ids.append(-1 if w is None else clean_words.setdefault(w, len(clean_words)))
+            flat.append(t)
+        offsets.append(len(flat))
+
+    out, out_offsets = _filter_token_ids(np.array(flat, dtype=np.int32),
+                                         np.array(offsets, dtype=np.int64),
+                                         np.array(clean_ids, dtype=np.int32),
+                                         min_sent_len, max_sent_len)
+    words = list(clean_words)
+    return [[words[c] for c in out[a:b]] for a, b in zip(out_offsets[:-1], out_offsets[1:])]
+
+def clean_sents(sentences: Iterable[list[str]], min_sent_len: int, 
                max_sent_len: int) -> list[list[str]]:
     """
     Given a filename for a NLTK gutenberg corpus text (provided by the 
     list_available_books function), return a cleaned list of sentences, where
     each sentence is comprised of each word (string). Removes chapter titles, 
-    punctuation, and other unwanted characters.
-    """
-    filtered = [s for s in sentences if min_sent_len <= len(s) <= max_sent_len+1]
-    cleaned = []
-    for sent in filtered:
-        if any(tok == "CHAPTER" for tok in sent):
-            continue
-        lowered = [tok.lower() for tok in sent]
-        if "chapter" in lowered:
-            i = lowered.index("chapter")
-            if i + 1 < len(sent):
-                nxt = sent[i + 1]
-                if nxt.isdigit() or is_roman(nxt):
-                    continue
-        sent = pos_tag(sent)
-        clean = []
-        for word, PoS in sent:
-            if not re.search(r"[A-Za-z0-9]", word):
-                continue
-            if word.isdigit():
-                continue
-            if len(word) > 1 and is_roman(word):
-                continue
-            if word in PUNCT:
-                continue
-            # if PoS == 'NNP':
-            #     clean.append(word)
-            #     continue
-            w = word.strip("_" + "".join(PUNCT)).lower()
-            if not w:
-                continue
-            if len(w) == 1 and w not in ('a', 'i'):
-                continue
-            clean.append(w)
-        if min_sent_len <= len(clean) <= max_sent_len:
-            cleaned.append(clean)
-
-    return cleaned
-
-def get_vocabulary(cleaned_book: list[list[str]]) -> set[str]:
-    """
-    Given a clean book, returns a set of the unique vocabulary words that appear
-    in the book.
-    """
-    vocab = set()
-    for sent in cleaned_book:
-        for w in sent:
-            vocab.add(w)
-    vocab.add('GAP')
-    return sorted(vocab)
+    punctuation, and other unwanted characters. The sentences may be any
+    iterable, such as the iterator returned by merged_books_sents.
+    """
+    filtered = pd.Series([s for s in sentences if min_sent_len <= len(s) <= max_sent_len+1],
+                         dtype=object)
+    heading = filtered.map(_is_chapter_heading).astype(bool)
+    tagged = _TAGGER.tag_sents(filtered[~heading].tolist())
+    return _clean_tagged_sents(tagged, min_sent_len, max_sent_len)
+
+def get_vocabulary(cleaned_book: list[list[str]]) -> list[str]:
+    """
+    Given a clean book, returns a sorted list of the unique vocabulary words
+    that appear in the book, plus 'GAP'.
+    """
+    toks = np.fromiter(itertools.chain.from_iterable(cleaned_book), dtype=object)
+    vocab = np.unique(toks).tolist()
+    vocab.append('GAP')
+    vocab.sort()
+    return vocab
 
 
 def get_sent_from_raw(filename: str):
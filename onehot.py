@@ -1,6 +1,10 @@
+from functools import cached_property
+import itertools
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from scipy.sparse import csr_matrix
+from scipy.special import xlogy
 
 class OneHot:
     """
@@ -17,40 +21,75 @@ class OneHot:
         self.N = len(sentences)
         self.V = len(vocabulary)
 
-        one_hot = np.zeros((self.N, self.L, self.V), dtype=int)
-        for i, sent in enumerate(sentences):
-            for j, word in enumerate(sent):
-                k = self.word2idx[word]
-                one_hot[i,j,k] = 1
-            gap_idx = self.word2idx['GAP']
-            for j in range(len(sent), self.L):
-                one_hot[i,j,gap_idx] = 1
+        # idx[i,j] is the vocab index of the word at position j of sentence i
+        # (GAP past the end of the sentence), i.e. the position of the single
+        # 1 in each one-hot slot. The (N, L*V) one-hot matrix is built from it
+        # only on demand.
+        self.idx = np.full((self.N, self.L), self.word2idx['GAP'], dtype=np.int32)
+        lens = np.fromiter((len(s) for s in sentences), dtype=np.int64, count=self.N)
+        flat = np.array(list(itertools.chain.from_iterable(sentences)), dtype=object)
+        rows = np.repeat(np.arange(self.N), lens)
+        cols = np.arange(len(flat)) - np.repeat(np.cumsum(lens) - lens, lens)
+        self.idx[rows, cols] = self._lookup(flat)
 
-        self.onehot_flat = one_hot.reshape(self.N, self.L*self.V)
+    def _lookup(self, words: np.array) -> np.array:
+        """
+        Return the vocab index of each of the given words, looked up in a
+        single vectorized hash-table pass.
+        """
+        ids = pd.Index(list(self.word2idx)).get_indexer(words)
+        missing = ids < 0
+        if missing.any():
+            raise KeyError(f"Words not in vocabulary: {sorted(set(words[missing].tolist()))[:10]}")
+        return ids
+
+    def _flat_columns(self) -> np.array:
+        """
+        Return the column of each nonzero entry in the flattened one-hot
+        encoding, row by row.
+        """
+        return (np.arange(self.L)[None, :]*self.V + self.idx).ravel()
+
+    def to_sparse(self) -> csr_matrix:
+        """
+        Return the flattened (N, L*V) one-hot encoding as a sparse matrix.
+        """
+        data = np.ones(self.N*self.L, dtype=np.int8)
+        indptr = np.arange(0, self.N*self.L + 1, self.L)
+        return csr_matrix((data, self._flat_columns(), indptr), shape=(self.N, self.L*self.V))
+
+    @property
+    def onehot_flat(self) -> np.array:
+        """
+        The flattened (N, L*V) one-hot encoding as a dense array. This is
+        materialized on every access, so keep a reference if it is reused.
+        """
+        flat = np.zeros((self.N, self.L*self.V), dtype=int)
+        flat[np.repeat(np.arange(self.N), self.L), self._flat_columns()] = 1
+        return flat
 
     def summarize(self) -> None:
         """
         Print the details of the one-hot encoding. 
         """
-        sent_lens_freq = {}
-        for sent in self.sentences:
-            length = len(sent)
-            len_str = str(length)
-            if len_str in sent_lens_freq:
-                sent_lens_freq[len_str] += 1
-            else:
-                sent_lens_freq[len_str] = 1
-        sorted_dict = sorted(sent_lens_freq.items(), key=lambda item: int(item[0]))
+        lens = np.fromiter((len(s) for s in self.sentences), dtype=np.int32, count=self.N)
+        counts = np.bincount(lens)
+        len_counts = [(i, int(c)) for i, c in enumerate(counts) if c]
         print(f"Number of sentences (N): {self.N}\n")
         print(f"Length of vocabulary: {self.V}\n")
-        print(f"Length of sentences count:\n {sorted_dict}\n")
+        print(f"Length of sentences count:\n {len_counts}\n")
 
     def plot(self) -> None:
         """
         Plots the (flattened) one-hot encoding.
         """
         plt.figure(figsize=(8,6))
-        plt.spy(self.onehot_flat, aspect='auto', markersize=1, color='navy')
+        # Each row has exactly L nonzeros, so plot them directly
+        xs = self._flat_columns()
+        ys = np.repeat(np.arange(self.N), self.L)
+        plt.scatter(xs, ys, s=1, marker=',', c='navy')
+        plt.xlim(-0.5, self.L*self.V-0.5)
+        plt.ylim(self.N-0.5, -0.5)
         for i in range(0, self.L*self.V-1, self.V):
             plt.axvline(x=i, color='red', linewidth=0.5)
         plt.xlabel(f"Position Slot L (0-{self.L-1}) x Vocab Index (0-{self.V-1}), LxV=(0-{self.L*self.V-1})")
@@ -59,31 +98,68 @@ class OneHot:
         plt.legend(['Presence', 'Position Delimiter'], loc='lower right')
         plt.show()
 
-    def partition_by_position(self, position: int) -> np.array:
+    def partition_by_position(self, position: int) -> csr_matrix:
         """
-        Partition the flattened one-hot encoding based on position.
-        Must be given a valid position (0-indexed)
+        Partition the flattened one-hot encoding based on position, as a
+        sparse (N, V) matrix. Must be given a valid position (0-indexed)
         """
         if position not in range(0, self.L):
             raise IndexError(f"Given position is not the sentence length range 0-{self.L-1}")
-        i = position
-        partition = self.onehot_flat[:, i*self.V:(i+1)*self.V]
+        data = np.ones(self.N, dtype=np.int8)
+        indptr = np.arange(self.N+1)
+        partition = csr_matrix((data, self.idx[:, position], indptr), shape=(self.N, self.V))
         return partition
     
+    @cached_property
+    def _marginals(self) -> np.array:
+        """
+        The (L, V) matrix of word probabilities at every position, computed
+        once and shared by the per-position methods.
+        """
+        # Count one position at a time over a contiguous copy of its column,
+        # so each bincount streams through N ints instead of striding over idx
+        idx_T = np.ascontiguousarray(self.idx.T)
+        P = np.zeros((self.L, self.V))
+        for j in range(self.L):
+            P[j] = np.bincount(idx_T[j], minlength=self.V)
+        P /= self.N
+        P.flags.writeable = False
+        return P
+
     def position_marginals(self, position: int) -> np.array:
         """
         Return the probabilities of seeing each vocab word at the given position.
         """
-        partition = self.partition_by_position(position)
-        p = partition.mean(axis=0)
-        return p
+        if position not in range(0, self.L):
+            raise IndexError(f"Given position is not the sentence length range 0-{self.L-1}")
+        return self._marginals[position].copy()
+
+    @cached_property
+    def _entropy(self) -> np.array:
+        """
+        The entropy (in bits) of every sentence position, computed once.
+        """
+        P = self._marginals
+        # xlogy(0, 0) is 0, so words never seen at a position contribute nothing
+        entropy = -xlogy(P, P).sum(axis=1) / np.log(2)
+        entropy.flags.writeable = False
+        return entropy
     
+    def dimensionality(self) -> tuple[np.array]:
+        """
+        Return the entropy and dimensionality of every sentence position.
+        """
+        entropy = self._entropy.copy()
+        dimensionality = 2**entropy
+        return (entropy, dimensionality)
+
     def position_dimensionality(self, position: int) -> tuple[float]:
         """
         Return the entropy and dimensionality of the given sentence position.
         """
-        p = self.position_marginals(position)
-        entropy = -np.sum(p * np.log2(p+1e-5))
+        if position not in range(0, self.L):
+            raise IndexError(f"Given position is not the sentence length range 0-{self.L-1}")
+        entropy = self._entropy[position]
         dimensionality = 2**entropy
         return (entropy, dimensionality)
     
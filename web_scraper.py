@@ -10,33 +10,80 @@ import requests
 import time
 import os
 import re
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# XML namespaces used in Project Gutenberg's RDF metadata records
+RDF_NS = {
+    'dcterms': 'http://purl.org/dc/terms/',
+    'pgterms': 'http://www.gutenberg.org/2009/pgterms/',
+}
+
+# Only build the parts of book pages that are actually read: the title,
+# author and download links
+BOOK_PAGE_STRAINER = SoupStrainer(['h1', 'a', 'table'])
+
+# Links to ebook pages, and how many of them a full search results page has
+EBOOK_LINK_RE = re.compile(r'/ebooks/\d+$')
+RESULTS_PER_PAGE = 25
+
 class GutenbergScraper:
-    def __init__(self, download_dir="gutenberg_books", delay=1.0):
+    def __init__(self, download_dir="gutenberg_books", delay=1.0, max_workers=4):
         """
         Initialize the scraper
         
         Args:
             download_dir (str): Directory to save downloaded books
-            delay (float): Delay between requests in seconds
+            delay (float): Delay between requests in seconds, shared by all workers
+            max_workers (int): Number of books processed concurrently
         """
         self.base_url = "https://www.gutenberg.org"
         self.download_dir = download_dir
         self.delay = delay
+        self.max_workers = max_workers
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (compatible; Educational scraper; respecting robots.txt)'
         })
+        # Keep one keep-alive connection per worker
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # Rate limiter state shared by all worker threads
+        self._rate_lock = threading.Lock()
+        self._next_request = 0.0
+        
+        # Per-filename locks, so editions that map to the same file are not
+        # downloaded over each other by different worker threads
+        self._file_locks_lock = threading.Lock()
+        self._file_locks = {}
         
         # Create download directory
         os.makedirs(self.download_dir, exist_ok=True)
+    
+    def _throttle(self):
+        """
+        Block until the next request is allowed, so that the total request
+        rate across all worker threads stays at one per `delay` seconds
+        """
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + self.delay
+        if wait > 0:
+            time.sleep(wait)
         
     def search_children_books(self, max_pages=5):
         """
@@ -70,20 +117,16 @@ class GutenbergScraper:
                 if page == 1:
                     page_url = search_url
                 else:
-                    page_url = f"{search_url}&start_index={25 * (page - 1)}"
+                    page_url = f"{search_url}&start_index={RESULTS_PER_PAGE * (page - 1)}"
                 
                 try:
-                    response = self.session.get(page_url)
-                    response.raise_for_status()
-                    
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    
+                    self._throttle()
                     # Find book links - look for links to ebook pages
-                    book_links = soup.find_all('a', href=re.compile(r'/ebooks/\d+$'))
+                    book_links = self._search_page_links(page_url)
                     
                     page_books = 0
-                    for link in book_links:
-                        book_url = urljoin(self.base_url, link['href'])
+                    for href in book_links:
+                        book_url = urljoin(self.base_url, href)
                         if book_url not in book_urls:
                             book_urls.append(book_url)
                             page_books += 1
@@ -94,9 +137,6 @@ class GutenbergScraper:
                     if page_books == 0:
                         break
                     
-                    # Respectful delay
-                    time.sleep(self.delay)
-                    
                 except requests.RequestException as e:
                     logger.error(f"Error searching page {page} for {query}: {e}")
                     continue
@@ -104,10 +144,104 @@ class GutenbergScraper:
         logger.info(f"Found total of {len(book_urls)} unique books")
         return book_urls
     
+    def _search_page_links(self, page_url):
+        """
+        Stream a search results page and collect its ebook links, stopping
+        the download as soon as a full page of results has been seen
+        
+        Args:
+            page_url (str): URL of the search results page
+            
+        Returns:
+            list: Unique ebook link hrefs, in page order
+        """
+        links = []
+        parser = etree.HTMLPullParser(events=('end',), tag='a')
+        with self.session.get(page_url, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(8192):
+                parser.feed(chunk)
+                for _, elem in parser.read_events():
+                    href = elem.get('href', '')
+                    if EBOOK_LINK_RE.search(href) and href not in links:
+                        links.append(href)
+                if len(links) >= RESULTS_PER_PAGE:
+                    break
+        return links
+    
     def get_book_info(self, book_url):
         """
         Get book information and find text download link
         
+        The text link is built directly from the ebook ID (Gutenberg's
+        canonical cache path), with the title and author read from the ebook's
+        RDF record. The book page is only fetched and parsed if the RDF lookup
+        fails, or later by download_book if the canonical text file is missing.
+        
+        Args:
+            book_url (str): URL of the book page
+            
+        Returns:
+            dict: Book information including title, author, and text URL
+        """
+        book_id_match = re.search(r'/ebooks/(\d+)', book_url)
+        if book_id_match:
+            book_info = self._get_book_info_direct(book_id_match.group(1), book_url)
+            if book_info:
+                return book_info
+        return self._get_book_info_from_page(book_url)
+    
+    def _get_book_info_direct(self, book_id, book_url):
+        """
+        Get book information from the RDF record, pointing at the canonical
+        text URL. Whether that file exists is left to the download itself, so
+        this costs a single request
+        
+        Args:
+            book_id (str): Project Gutenberg ebook ID
+            book_url (str): URL of the book page
+            
+        Returns:
+            dict: Book information, or None if the metadata is unavailable
+        """
+        text_url = f"{self.base_url}/cache/epub/{book_id}/pg{book_id}.txt"
+        try:
+            self._throttle()
+            response = self.session.get(f"{self.base_url}/ebooks/{book_id}.rdf")
+            response.raise_for_status()
+            root = ET.fromstring(response.content)
+        except (requests.RequestException, ET.ParseError) as e:
+            logger.warning(f"Error looking up {book_url} directly, falling back to book page: {e}")
+            return None
+        
+        title = root.findtext('.//dcterms:title', namespaces=RDF_NS)
+        title = " ".join(title.split()) if title else "Unknown Title"
+        
+        # Format the author like the book page does, e.g. "Carroll, Lewis, 1832-1898"
+        author = "Unknown Author"
+        agent = root.find('.//dcterms:creator/pgterms:agent', RDF_NS)
+        if agent is not None and agent.findtext('pgterms:name', namespaces=RDF_NS):
+            author = agent.findtext('pgterms:name', namespaces=RDF_NS).strip()
+            birth = agent.findtext('pgterms:birthdate', default='', namespaces=RDF_NS)
+            death = agent.findtext('pgterms:deathdate', default='', namespaces=RDF_NS)
+            if birth or death:
+                author = f"{author}, {birth}-{death}"
+        
+        logger.info(f"Book: {title} by {author}")
+        logger.info(f"Found text link: {text_url}")
+        
+        return {
+            'title': title,
+            'author': author,
+            'text_url': text_url,
+            'book_url': book_url,
+            'direct': True
+        }
+    
+    def _get_book_info_from_page(self, book_url):
+        """
+        Get book information by parsing the book page for a text download link
+        
         Args:
             book_url (str): URL of the book page
             
@@ -115,10 +249,11 @@ class GutenbergScraper:
             dict: Book information including title, author, and text URL
         """
         try:
+            self._throttle()
             response = self.session.get(book_url)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = BeautifulSoup(response.content, 'lxml', parse_only=BOOK_PAGE_STRAINER)
             
             # Extract book information
             title_elem = soup.find('h1', {'itemprop': 'name'})
@@ -180,6 +315,7 @@ class GutenbergScraper:
                     
                     for url in potential_urls:
                         try:
+                            self._throttle()
                             test_response = self.session.head(url)
                             if test_response.status_code == 200:
                                 text_link = url
@@ -204,6 +340,42 @@ class GutenbergScraper:
             logger.error(f"Error getting book info from {book_url}: {e}")
             return None
     
+    def _find_downloaded(self, filename):
+        """
+        Find an existing download of a book
+        
+        Book pages title books as "<title> by <author>", while RDF records
+        give just "<title>", so a book downloaded via its book page is saved
+        as "<author> - <title> by <author>.txt". Both names are matched.
+        
+        Args:
+            filename (str): Cleaned filename the book would be saved under
+            
+        Returns:
+            str: Name of the existing file, or None if not downloaded yet
+        """
+        if os.path.exists(os.path.join(self.download_dir, filename)):
+            return filename
+        stem = filename[:-len('.txt')] if filename.endswith('.txt') else filename
+        prefix = stem + ' by '
+        for name in os.listdir(self.download_dir):
+            if name.startswith(prefix) and name.endswith('.txt'):
+                return name
+        return None
+    
+    def _file_lock(self, filename):
+        """
+        Get the lock guarding downloads to the given filename
+        
+        Args:
+            filename (str): Cleaned filename of the book
+            
+        Returns:
+            threading.Lock: Lock shared by all downloads to that filename
+        """
+        with self._file_locks_lock:
+            return self._file_locks.setdefault(filename, threading.Lock())
+    
     def download_book(self, book_info):
         """
         Download a book's text file
@@ -218,36 +390,59 @@ class GutenbergScraper:
             logger.warning(f"No text URL found for book: {book_info.get('title', 'Unknown') if book_info else 'Unknown'}")
             return False
         
-        try:
-            # Clean filename
-            filename = f"{book_info['author']} - {book_info['title']}.txt"
-            filename = re.sub(r'[<>:"/\\|?*]', '', filename)
-            filename = filename[:200]  # Limit filename length
-            filepath = os.path.join(self.download_dir, filename)
-            
-            # Skip if already downloaded
-            if os.path.exists(filepath):
-                logger.info(f"Already downloaded: {filename}")
+        # Clean filename
+        filename = f"{book_info['author']} - {book_info['title']}.txt"
+        filename = re.sub(r'[<>:"/\\|?*]', '', filename)
+        filename = filename[:200]  # Limit filename length
+        filepath = os.path.join(self.download_dir, filename)
+        
+        # Hold the file's lock from the existence check until it is saved, so
+        # another edition with the same filename waits and then finds it
+        with self._file_lock(filename):
+            try:
+                # Skip if already downloaded
+                existing = self._find_downloaded(filename)
+                if existing:
+                    logger.info(f"Already downloaded: {existing}")
+                    return True
+                
+                logger.info(f"Downloading: {book_info['title']} by {book_info['author']}")
+                
+                # Stream the file to disk in fixed-size chunks, without decoding
+                # it. Write to a unique temporary file first so an interrupted
+                # download is not later mistaken for a complete one
+                self._throttle()
+                partpath = None
+                try:
+                    with self.session.get(book_info['text_url'], stream=True) as response:
+                        response.raise_for_status()
+                        with tempfile.NamedTemporaryFile(dir=self.download_dir, suffix='.part',
+                                                         delete=False) as f:
+                            partpath = f.name
+                            for chunk in response.iter_content(1 << 16):
+                                f.write(chunk)
+                    os.replace(partpath, filepath)
+                finally:
+                    # Don't leave a partial file behind if the download failed
+                    if partpath and os.path.exists(partpath):
+                        os.remove(partpath)
+                
+                logger.info(f"Successfully downloaded: {filename}")
                 return True
-            
-            logger.info(f"Downloading: {book_info['title']} by {book_info['author']}")
-            
-            response = self.session.get(book_info['text_url'])
-            response.raise_for_status()
-            
-            # Save the file
-            with open(filepath, 'w', encoding='utf-8', errors='ignore') as f:
-                f.write(response.text)
-            
-            logger.info(f"Successfully downloaded: {filename}")
-            return True
-            
-        except requests.RequestException as e:
-            logger.error(f"Error downloading {book_info['title']}: {e}")
-            return False
-        except IOError as e:
-            logger.error(f"Error saving file {filename}: {e}")
-            return False
+                
+            except requests.RequestException as e:
+                response = getattr(e, 'response', None)
+                if not (book_info.get('direct') and response is not None and response.status_code == 404):
+                    logger.error(f"Error downloading {book_info['title']}: {e}")
+                    return False
+            except IOError as e:
+                logger.error(f"Error saving file {filename}: {e}")
+                return False
+        
+        # The canonical text file is missing; look the book up on its page instead.
+        # This happens outside the file lock, as the fallback may use another filename
+        logger.info(f"No canonical text file for {book_info['title']}, falling back to book page")
+        return self.download_book(self._get_book_info_from_page(book_info['book_url']))
     
     def scrape_children_books(self, max_books=20, max_search_pages=3):
         """
@@ -269,26 +464,24 @@ class GutenbergScraper:
         # Limit to max_books
         book_urls = book_urls[:max_books]
         
-        downloaded = 0
-        failed = 0
-        
-        for i, book_url in enumerate(book_urls, 1):
+        def process_book(args):
+            i, book_url = args
             logger.info(f"Processing book {i}/{len(book_urls)}")
             
-            # Get book information
-            book_info = self.get_book_info(book_url)
-            time.sleep(self.delay)
-            
-            if book_info:
-                # Download the book
-                if self.download_book(book_info):
-                    downloaded += 1
-                else:
-                    failed += 1
-                    
-                time.sleep(self.delay)
-            else:
-                failed += 1
+            # Get book information and download the book. A failure counts
+            # against this book only instead of stopping the whole run
+            try:
+                book_info = self.get_book_info(book_url)
+                return bool(book_info) and self.download_book(book_info)
+            except Exception as e:
+                logger.error(f"Error processing {book_url}: {e}")
+                return False
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(process_book, enumerate(book_urls, 1)))
+        
+        downloaded = sum(results)
+        failed = len(results) - downloaded
         
         logger.info(f"Scraping completed! Downloaded: {downloaded}, Failed: {failed}")
         logger.info(f"Books saved to: {os.path.abspath(self.download_dir)}")
@@ -300,6 +493,7 @@ def main():
     MAX_BOOKS = 10  # Number of books to download
     MAX_SEARCH_PAGES = 2  # Number of search pages to process
     DELAY = 2.0  # Delay between requests (seconds)
+    MAX_WORKERS = 4  # Number of books processed concurrently
     
     logger.info("Project Gutenberg Children's Books Scraper")
     logger.info("=" * 45)
@@ -307,11 +501,13 @@ def main():
     logger.info(f"- Max books to download: {MAX_BOOKS}")
     logger.info(f"- Max search pages: {MAX_SEARCH_PAGES}")
     logger.info(f"- Delay between requests: {DELAY} seconds")
+    logger.info(f"- Concurrent workers: {MAX_WORKERS}")
     
     # Create scraper instance
     scraper = GutenbergScraper(
         download_dir="children_books",
-        delay=DELAY
+        delay=DELAY,
+        max_workers=MAX_WORKERS
     )
     
     # Start scraping